@@ -1,115 +1,554 @@
 from mcp.server.fastmcp import FastMCP, Context, Image
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
 from collections.abc import AsyncIterator
-from dataclasses import dataclass
-from typing import Optional, Dict, Any, Union, List
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Union, List, Literal, TypeVar
+import asyncio
 import numpy as np
 import io
+import json
+import logging
+import textwrap
+import time
+import uuid
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
 from PIL import Image as PILImage
 
 # Import OpenFlexure client library
 import openflexure_microscope_client as ofm_client
 
+# libjpeg-turbo is optional; fall back to Pillow's encoder if it's missing
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJPF_GRAY, TJSAMP_420, TJSAMP_GRAY
+    _tj = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _tj = None
+
+# orjson is optional too; it's much faster than json for large request bodies
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _dumps(obj: Any) -> bytes:
+    """Serialise a request body to JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Address of the microscope on the local network
+MICROSCOPE_HOST = "192.168.100.124"
+
+# How old (in seconds) a stage position reading may be when checking for no-op moves
+POSITION_MAX_AGE = 0.2
+
+# How long (in seconds) the extension list is trusted before it is re-fetched
+EXTENSIONS_TTL = 30.0
+
+# Extension and link that can acquire a whole Z-stack in a single request
+ZSTACK_EXTENSION = ("org.openflexure.scan", "tile")
+
+# How many finished background jobs are kept for their results to be read
+MAX_FINISHED_JOBS = 16
+
+# Pause (in seconds) between status checks of a running task; it doubles up
+# to the maximum, so short moves return quickly and long scans poll gently
+TASK_POLL_INTERVAL = 0.05
+TASK_POLL_INTERVAL_MAX = 0.5
+
+class AsyncMicroscope:
+    """
+    Async counterpart to the parts of ofm_client.MicroscopeClient the tools use
+
+    Requests go to the same REST endpoints as the sync client, but over a
+    shared httpx.AsyncClient, so they run on the event loop rather than
+    each tying up a worker thread.
+    """
+    
+    def __init__(self, host: str, port: int = 5000):
+        # The sync client sets no timeouts either; long actions are polled
+        self.client = httpx.AsyncClient(
+            base_url=f"http://{host}:{port}/api/v2",
+            limits=httpx.Limits(max_keepalive_connections=16),
+            timeout=None,
+        )
+        # Last position read, so callers that can tolerate a slightly stale
+        # reading don't need a round-trip; any action POSTed clears it
+        self._position: Optional[Dict[str, int]] = None
+        self._position_ts = 0.0
+        # Bumped whenever the cache is cleared, so a reading that was in
+        # flight across a move isn't stored as if it were fresh
+        self._position_gen = 0
+    
+    async def get_json(self, path: str) -> Any:
+        """Perform an HTTP GET request and return the JSON response"""
+        r = await self.client.get(path)
+        r.raise_for_status()
+        return r.json()
+    
+    async def post_json(self, path: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+        """Make an HTTP POST request and return the JSON response, waiting for it if it is a task"""
+        # Any action may move the stage (extensions included), so don't trust
+        # the cached position while one is running or after it has finished
+        self.invalidate_position()
+        try:
+            r = await self.client.post(path, content=_dumps(payload or {}),
+                                       headers={"Content-Type": "application/json"})
+            r.raise_for_status()
+            result = r.json()
+            if self._is_task(result):
+                return await self.poll_task(result)
+            return result
+        finally:
+            self.invalidate_position()
+    
+    def invalidate_position(self) -> None:
+        """Forget the cached position, e.g. after the stage was moved by another client"""
+        self._position = None
+        self._position_gen += 1
+    
+    @staticmethod
+    def _is_task(response: Any) -> bool:
+        try:
+            href = response["links"]["self"]["href"]
+        except (KeyError, TypeError):
+            return False
+        return "/api/v2/tasks/" in href or "/api/v2/actions/" in href
+    
+    async def poll_task(self, task: Dict[str, Any]) -> Any:
+        """Poll a task until it finishes, and return its output"""
+        interval = TASK_POLL_INTERVAL
+        while task["status"] in ofm_client.microscope_client.ACTION_RUNNING_KEYWORDS:
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, TASK_POLL_INTERVAL_MAX)
+            task = await self.get_json(task["links"]["self"]["href"])
+        for output_key in ofm_client.microscope_client.ACTION_OUTPUT_KEYS:
+            if output_key in task:
+                return task[output_key]
+        return None
+    
+    async def position(self, max_age: float = 0.0) -> Dict[str, int]:
+        """Return the position of the stage as a dictionary, reusing a reading up to max_age seconds old"""
+        if (max_age > 0 and self._position is not None
+                and time.monotonic() - self._position_ts <= max_age):
+            return dict(self._position)
+        gen = self._position_gen
+        position = await self.get_json("/instrument/state/stage/position")
+        if gen == self._position_gen:
+            self._position, self._position_ts = position, time.monotonic()
+        return dict(position)
+    
+    async def move(self, position: Dict[str, int], absolute: bool = True) -> Any:
+        """Move the stage to (or, if absolute is False, by) a given x/y/z position"""
+        pos = {k: int(position[k]) for k in "xyz"}
+        pos['absolute'] = absolute
+        return await self.post_json("/actions/stage/move", pos)
+    
+    async def move_rel(self, position: Dict[str, int]) -> Any:
+        """Move the stage by a given amount"""
+        return await self.move(position, absolute=False)
+    
+    async def grab_image_raw(self) -> bytes:
+        """Grab a JPEG frame from the preview stream"""
+        r = await self.client.get("/streams/snapshot")
+        r.raise_for_status()
+        return r.content
+    
+    async def grab_image(self) -> PILImage.Image:
+        """Grab a frame from the preview stream as a PIL image"""
+        return PILImage.open(io.BytesIO(await self.grab_image_raw()))
+    
+    async def capture_image_raw(self) -> bytes:
+        """Capture an image to RAM and return it as JPEG bytes"""
+        payload = {"use_video_port": True, "bayer": False}
+        r = await self.client.post("/actions/camera/ram-capture", json=payload,
+                                   headers={'Accept': 'image/jpeg'})
+        r.raise_for_status()
+        return r.content
+    
+    async def capture_image(self) -> PILImage.Image:
+        """Capture an image to RAM and return it as a PIL image"""
+        return PILImage.open(io.BytesIO(await self.capture_image_raw()))
+    
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
 @dataclass
 class MicroscopeContext:
     microscope: ofm_client.MicroscopeClient
+    amicroscope: Optional[AsyncMicroscope] = None
+    extensions: Dict[str, Any] = field(default_factory=dict)
+    extensions_ts: float = 0.0
+    jobs: Dict[str, asyncio.Task] = field(default_factory=dict)
+    links: Dict[tuple, Any] = field(default_factory=dict)
+
+def _get_extensions(ctx: MicroscopeContext) -> Dict[str, Any]:
+    """Return the cached extensions mapping, refreshing it if it is stale"""
+    if time.monotonic() - ctx.extensions_ts > EXTENSIONS_TTL:
+        ctx.microscope.populate_extensions()
+        ctx.extensions = dict(ctx.microscope.extensions)
+        ctx.extensions_ts = time.monotonic()
+        ctx.links.clear()
+    return ctx.extensions
+
+async def _return_to(microscope: AsyncMicroscope, target: Dict[str, int],
+                     current: Dict[str, int]) -> Dict[str, int]:
+    """Move back to target with an absolute move, unless already there, and return the new position"""
+    # An absolute move lands on target even if something else has moved the
+    # stage since current was read; the endpoint takes all three axes anyway
+    if all(current[k] == target[k] for k in "xyz"):
+        return current
+    await microscope.move(target)
+    return await microscope.position()
+
+def _start_job(ctx: MicroscopeContext, coro) -> str:
+    """Run a coroutine as a background job and return the id to poll it with"""
+    # Results are only dropped by get_job_result, so forget the oldest
+    # finished jobs if nobody is collecting them
+    finished = [k for k, task in ctx.jobs.items() if task.done()]
+    for k in finished[:-MAX_FINISHED_JOBS]:
+        del ctx.jobs[k]
+    
+    job_id = uuid.uuid4().hex
+    task = asyncio.create_task(coro)
+    task.add_done_callback(lambda task: _log_job_failure(job_id, task))
+    ctx.jobs[job_id] = task
+    return job_id
+
+def _log_job_failure(job_id: str, task: asyncio.Task) -> None:
+    """Log a background job's exception, since its result may never be read"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background job %s failed", job_id, exc_info=task.exception())
+
+def _job_status(ctx: MicroscopeContext, job_id: str) -> Optional[str]:
+    """Describe a job that has no result to hand over, or return None if it has one"""
+    task = ctx.jobs.get(job_id)
+    if task is None:
+        return f"No job with id '{job_id}'."
+    if not task.done():
+        return f"Job {job_id} is still running."
+    if task.cancelled():
+        return f"Job {job_id} was cancelled."
+    if task.exception() is not None:
+        return f"Job {job_id} failed: {str(task.exception())}"
+    return None
+
+def _get_link(ctx: MicroscopeContext, extension_name: str, link_name: str) -> Optional[Any]:
+    """Return the bound link for an extension endpoint, or None if there isn't one"""
+    extensions = _get_extensions(ctx)
+    key = (extension_name, link_name)
+    if key not in ctx.links:
+        ext = extensions.get(extension_name)
+        if ext is None or link_name not in ext.links:
+            return None
+        ctx.links[key] = ext[link_name]
+    return ctx.links[key]
+
+async def buffered(source: AsyncIterator[T], n: int) -> AsyncIterator[T]:
+    """
+    Run an async iterator ahead of its consumer, keeping up to n items queued
+
+    The source is driven by a background task, so it can start producing the
+    next item while the consumer is still working on the previous one.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=n)
+    done = object()
+
+    async def produce():
+        try:
+            async for item in source:
+                await queue.put((item, None))
+            await queue.put((done, None))
+        except Exception as e:
+            await queue.put((done, e))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        producer.cancel()
+
+def encode_image(pil_image: PILImage.Image, format: str = "jpeg") -> bytes:
+    """Encode a PIL image as JPEG (default) or PNG bytes, using libjpeg-turbo if available"""
+    if format == "png":
+        # Favour speed over size; PNG is only used when lossless is required
+        img_byte_arr = io.BytesIO()
+        pil_image.save(img_byte_arr, format='PNG', compress_level=1)
+        return img_byte_arr.getvalue()
+    if pil_image.mode not in ("RGB", "L"):
+        pil_image = pil_image.convert("RGB")
+    if _tj is not None:
+        if pil_image.mode == "L":
+            return _tj.encode(np.asarray(pil_image), quality=90,
+                              pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY)
+        return _tj.encode(np.asarray(pil_image), quality=90,
+                          pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+    img_byte_arr = io.BytesIO()
+    pil_image.save(img_byte_arr, format='JPEG', quality=90, subsampling=2, optimize=False)
+    # getvalue() hands over the BytesIO's own buffer without copying it, as
+    # long as no getbuffer() view is alive; bytes(getbuffer()) would copy
+    return img_byte_arr.getvalue()
+
+def make_preview(image_bytes: bytes, size: int) -> bytes:
+    """Shrink a JPEG frame to fit within size x size pixels, returning it untouched if it already does or size is 0"""
+    if size <= 0:
+        return image_bytes
+    pil_image = PILImage.open(io.BytesIO(image_bytes))
+    if max(pil_image.size) <= size:
+        return image_bytes
+    # thumbnail() puts the JPEG decoder in draft mode, so libjpeg scales the
+    # frame down during decoding rather than decoding it at full size first
+    pil_image.thumbnail((size, size), PILImage.BILINEAR)
+    return encode_image(pil_image)
+
+def _make_session() -> requests.Session:
+    """Create a keep-alive HTTP session with a pool sized for concurrent tool calls"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=16, pool_block=False))
+    session.headers["Connection"] = "keep-alive"
+    return session
 
 @asynccontextmanager
 async def microscope_lifespan(server: FastMCP) -> AsyncIterator[MicroscopeContext]:
     """Connect to the microscope on startup and disconnect on shutdown"""
-    # Connect to microscope using the provided IP address
-    microscope = ofm_client.MicroscopeClient("192.168.100.124")
+    # The client calls requests.get()/post() at module level, so point it at
+    # a pooled session to reuse connections instead of opening one per call
+    client_module = ofm_client.microscope_client
+    session = _make_session()
+    client_module.requests = session
+    amicroscope = AsyncMicroscope(MICROSCOPE_HOST)
     try:
-        yield MicroscopeContext(microscope=microscope)
+        # Connect to microscope using the provided IP address
+        microscope = await asyncio.to_thread(ofm_client.MicroscopeClient, MICROSCOPE_HOST)
+        # The client fetches the extension list when it connects, so reuse it
+        context = MicroscopeContext(
+            microscope=microscope,
+            amicroscope=amicroscope,
+            extensions=dict(microscope.extensions),
+            extensions_ts=time.monotonic(),
+        )
+        try:
+            yield context
+        finally:
+            # Don't leave background jobs running against a closed client
+            for task in context.jobs.values():
+                task.cancel()
     finally:
-        # Clean up connection if needed
-        pass  # The client doesn't have an explicit close method based on the README
+        # The sync client doesn't have an explicit close method, so just
+        # release the pooled connections and restore the plain requests module
+        await amicroscope.aclose()
+        client_module.requests = requests
+        session.close()
 
 # Create MCP server with microscope lifespan
 mcp = FastMCP(
     "OpenFlexure Microscope", 
     lifespan=microscope_lifespan,
-    dependencies=["openflexure-microscope-client", "matplotlib", "numpy", "pillow"]
+    dependencies=["openflexure-microscope-client", "httpx", "numpy", "pillow"]
 )
 
+def _lifespan_context(ctx: Optional[Context] = None) -> MicroscopeContext:
+    """Return the lifespan context from ctx, or from the current request if there is none"""
+    if ctx is None:
+        ctx = mcp.get_context()
+    return ctx.request_context.lifespan_context
+
+# ---- Response Templates ----
+
+# Dedented once here so responses don't carry source indentation over the wire
+INFO_TEMPLATE = textwrap.dedent("""\
+    OpenFlexure Microscope Information:
+
+    Device ID: {device_id}
+    Name: {name}
+    Version: {version}
+    Board: {board}
+
+    Active Extensions:
+    {extensions}
+    """)
+
+INFO_FALLBACK_TEMPLATE = textwrap.dedent("""\
+    OpenFlexure Microscope connected at: {host}
+
+    Active Extensions:
+    {extensions}
+
+    Error getting detailed info: {error}
+    """)
+
+POSITION_TEMPLATE = textwrap.dedent("""\
+    Current Stage Position:
+
+    Dictionary format:
+    X: {x} steps
+    Y: {y} steps
+    Z: {z} steps
+
+    Array format: {array}
+    """)
+
+EXTENSIONS_TEMPLATE = textwrap.dedent("""\
+    Available Microscope Extensions:
+
+    {extensions}
+    """)
+
+MOVE_TEMPLATE = textwrap.dedent("""\
+    Stage moved successfully!
+
+    Before: {before}
+    After: {after}
+    Delta: X: {dx}, Y: {dy}, Z: {dz}
+    """)
+
+AUTOFOCUS_TEMPLATE = textwrap.dedent("""\
+    Autofocus completed!
+
+    Z position before: {before_z}
+    Z position after: {after_z}
+    Z change: {dz}
+
+    Autofocus result details:
+    {result}
+    """)
+
+EXTENSION_CALL_TEMPLATE = textwrap.dedent("""\
+    Extension call successful:
+
+    Extension: {extension_name}
+    Link: {link_name}
+    Method: {method}
+
+    Result:
+    {result}
+    """)
+
+ZSTACK_BATCHED_TEMPLATE = textwrap.dedent("""\
+    Z-stack acquisition completed on the microscope!
+
+    Captured {captured} images using {extension}
+    Z range: {start_z} to {end_z}
+    Step size: {z_step:.2f}
+
+    Scan result:
+    {result}
+
+    Current position: {position}
+    """)
+
+ZSTACK_TEMPLATE = textwrap.dedent("""\
+    Z-stack acquisition completed!
+
+    Captured {count} images{merged}
+    Z range: {start_z} to {end_z}
+    Step size: {z_step:.2f}
+
+    Images captured at Z positions:
+    {zs}
+
+    Current position: {position}
+    """)
+
+# How each call_extension method is made on a bound link
+EXTENSION_METHODS = {
+    "get": lambda microscope, link, payload: microscope.get_json(link.href),
+    "post": lambda microscope, link, payload: microscope.post_json(link.href, payload),
+}
+
 # ---- Resource Endpoints ----
 
 @mcp.resource("microscope://info")
-def get_microscope_info() -> str:
+async def get_microscope_info() -> str:
     """Get information about the connected microscope"""
     # Access the microscope via the context's request_context
-    microscope = mcp.current_context.request_context.lifespan_context.microscope
+    context = _lifespan_context()
+    extensions = await asyncio.to_thread(_get_extensions, context)
     
     # Get basic information from the microscope
     # Note: Using the extensions to get device info based on README
     try:
-        device_info = microscope.extensions.get("org.openflexure.microscope").get("device-info").get()
-        return f"""
-        OpenFlexure Microscope Information:
-        
-        Device ID: {device_info.get('device_id', 'Unknown')}
-        Name: {device_info.get('name', 'Unknown')}
-        Version: {device_info.get('version', 'Unknown')}
-        Board: {device_info.get('board', 'Unknown')}
-        
-        Active Extensions:
-        {', '.join(microscope.extensions.keys())}
-        """
+        link = extensions["org.openflexure.microscope"]["device-info"]
+        device_info = await context.amicroscope.get_json(link.href)
+        return INFO_TEMPLATE.format(
+            device_id=device_info.get('device_id', 'Unknown'),
+            name=device_info.get('name', 'Unknown'),
+            version=device_info.get('version', 'Unknown'),
+            board=device_info.get('board', 'Unknown'),
+            extensions=', '.join(extensions.keys()),
+        )
     except Exception as e:
         # Fallback if extension not available
-        return f"""
-        OpenFlexure Microscope connected at: 192.168.100.124
-        
-        Active Extensions:
-        {', '.join(microscope.extensions.keys())}
-        
-        Error getting detailed info: {str(e)}
-        """
+        return INFO_FALLBACK_TEMPLATE.format(
+            host=MICROSCOPE_HOST,
+            extensions=', '.join(extensions.keys()),
+            error=str(e),
+        )
 
 @mcp.resource("microscope://position")
-def get_position() -> str:
+async def get_position() -> str:
     """Get the current position of the microscope stage"""
-    microscope = mcp.current_context.request_context.lifespan_context.microscope
-    
-    # Get position using the position property mentioned in README
-    position = microscope.position
-    position_array = microscope.get_position_array()
-    
-    return f"""
-    Current Stage Position:
-    
-    Dictionary format:
-    X: {position.get('x', 0)} steps
-    Y: {position.get('y', 0)} steps
-    Z: {position.get('z', 0)} steps
-    
-    Array format: {position_array}
-    """
+    microscope = _lifespan_context().amicroscope
+    
+    # Get position using the same endpoint as the client's position property
+    position = await microscope.position()
+    position_array = np.array([position[k] for k in "xyz"])
+    
+    return POSITION_TEMPLATE.format(
+        x=position.get('x', 0),
+        y=position.get('y', 0),
+        z=position.get('z', 0),
+        array=position_array,
+    )
 
 @mcp.resource("microscope://extensions")
-def get_extensions() -> str:
+async def get_extensions() -> str:
     """Get the list of available extensions on the microscope"""
-    microscope = mcp.current_context.request_context.lifespan_context.microscope
-    
-    extensions = microscope.extensions.keys()
-    extension_info = []
+    context = _lifespan_context()
     
-    for ext_name in extensions:
-        ext = microscope.extensions[ext_name]
-        links = list(ext.keys())
-        extension_info.append(f"- {ext_name}: {', '.join(links)}")
+    # Link tables come back with the extension list, so at most one request
+    # (a refresh of a stale cache) is needed here; keep it off the event loop
+    extensions = await asyncio.to_thread(_get_extensions, context)
+    extension_info = [f"- {ext_name}: {', '.join(ext.links)}" for ext_name, ext in extensions.items()]
     
-    return f"""
-    Available Microscope Extensions:
+    return EXTENSIONS_TEMPLATE.format(extensions='\n'.join(extension_info))
+
+@mcp.resource("microscope://job/{job_id}")
+async def get_job(job_id: str) -> str:
+    """
+    Get the status of a background job, or its result once it has finished
     
-    {''.join(extension_info)}
+    Reading this doesn't forget the job; get_job_result does. A resource
+    template has a single MIME type, so image results are left for that
+    tool to return.
     """
+    context = _lifespan_context()
+    
+    status = _job_status(context, job_id)
+    if status is not None:
+        return status
+    result = context.jobs[job_id].result()
+    if isinstance(result, Image):
+        return f"Job {job_id} has finished. Call get_job_result with this id for the image."
+    return result
 
 # ---- Tool Endpoints ----
 
 @mcp.tool()
-def move_stage(ctx: Context, x: Optional[int] = None, y: Optional[int] = None, z: Optional[int] = None, 
-               relative: bool = False) -> str:
+async def move_stage(ctx: Context, x: Optional[int] = None, y: Optional[int] = None, z: Optional[int] = None, 
+               relative: bool = False, report_delta: bool = False) -> str:
     """
     Move the microscope stage to a specific position
     
@@ -118,8 +557,9 @@ def move_stage(ctx: Context, x: Optional[int] = None, y: Optional[int] = None, z
     - y: Y-axis position in steps (optional)
     - z: Z-axis position in steps (optional)
     - relative: If True, perform a relative move; otherwise, absolute move (default: False)
+    - report_delta: If True, read the position before and after the move and report the change (default: False)
     """
-    microscope = ctx.request_context.lifespan_context.microscope
+    microscope = _lifespan_context(ctx).amicroscope
     
     # Create position dictionary with only specified axes
     position = {}
@@ -133,83 +573,157 @@ def move_stage(ctx: Context, x: Optional[int] = None, y: Optional[int] = None, z
     if not position:
         return "No position specified. Please provide x, y, or z coordinates."
     
-    # Move the stage using the appropriate method from README
-    before_pos = microscope.position.copy()
+    # The move endpoint needs all three axes, so fill in the unspecified ones
+    if relative:
+        # Any non-zero offset is a real move
+        if not any(position.values()):
+            return "Stage not moved: the requested offset is zero."
+        target = {k: position.get(k, 0) for k in "xyz"}
+    else:
+        # A recent reading is accurate enough to spot a move to where the
+        # stage already is, which would waste a round-trip and settle time
+        current = await microscope.position(max_age=POSITION_MAX_AGE)
+        if all(current.get(k) == v for k, v in position.items()):
+            return f"Stage already at {position}, no move needed."
+        target = {**current, **position}
     
+    # Reading the position costs a round-trip each way, so only do it on request
+    if report_delta:
+        before_pos = await microscope.position()
+    
+    # Move the stage using the appropriate method from README
     if relative:
-        microscope.move_rel(position)
+        await microscope.move_rel(target)
     else:
-        microscope.move(position)
+        await microscope.move(target)
     
-    after_pos = microscope.position
+    if not report_delta:
+        return f"Stage moved successfully {'by' if relative else 'to'} {position}"
     
-    return f"""
-    Stage moved successfully!
+    after_pos = await microscope.position()
     
-    Before: {before_pos}
-    After: {after_pos}
-    Delta: X: {after_pos['x'] - before_pos['x']}, Y: {after_pos['y'] - before_pos['y']}, Z: {after_pos['z'] - before_pos['z']}
-    """
+    return MOVE_TEMPLATE.format(
+        before=before_pos,
+        after=after_pos,
+        dx=after_pos['x'] - before_pos['x'],
+        dy=after_pos['y'] - before_pos['y'],
+        dz=after_pos['z'] - before_pos['z'],
+    )
 
-@mcp.tool()
-def capture_image(ctx: Context, high_quality: bool = True) -> Image:
-    """
-    Capture an image from the microscope
-    
-    Parameters:
-    - high_quality: If True, use capture_image(); if False, use grab_image() (default: True)
-    """
-    microscope = ctx.request_context.lifespan_context.microscope
+async def _capture(context: MicroscopeContext, high_quality: bool, format: str) -> Image:
+    """Capture or grab an image and encode it in the requested format"""
+    microscope = context.amicroscope
+    
+    # Both the capture and the preview stream already serve JPEG, so pass it
+    # through untouched; re-encoding would only cost time and quality
+    if format == "jpeg":
+        if high_quality:
+            img_bytes = await microscope.capture_image_raw()
+        else:
+            img_bytes = await microscope.grab_image_raw()
+        return Image(data=img_bytes, format="jpeg")
     
     # Capture image using the appropriate method
     if high_quality:
-        ctx.info("Capturing high-quality image...")
-        pil_image = microscope.capture_image()
-        title = "High-quality image"
+        pil_image = await microscope.capture_image()
     else:
-        ctx.info("Grabbing quick preview image...")
-        pil_image = microscope.grab_image()
-        title = "Preview image"
+        pil_image = await microscope.grab_image()
     
-    # Convert PIL image to bytes
-    img_byte_arr = io.BytesIO()
-    pil_image.save(img_byte_arr, format='PNG')
-    img_bytes = img_byte_arr.getvalue()
+    # Encode off the event loop; this is CPU-bound for full-size frames
+    img_bytes = await asyncio.to_thread(encode_image, pil_image, format)
     
     # Create MCP Image object
-    return Image(data=img_bytes, format="png")
+    return Image(data=img_bytes, format=format)
 
-@mcp.tool()
-def autofocus(ctx: Context) -> str:
+@mcp.tool(structured_output=False)
+async def capture_image(ctx: Context, high_quality: bool = True,
+                        format: Literal["jpeg", "png"] = "jpeg",
+                        background: bool = False) -> Union[Image, str]:
     """
-    Run the autofocus routine
+    Capture an image from the microscope
+    
+    Parameters:
+    - high_quality: If True, use capture_image(); if False, use grab_image() (default: True)
+    - format: Image format to return, "jpeg" or lossless "png" (default: "jpeg")
+    - background: If True, return a job id straight away and capture in the background;
+      call get_job_result with the id for the image (default: False)
     """
-    microscope = ctx.request_context.lifespan_context.microscope
+    context = _lifespan_context(ctx)
+    
+    if high_quality:
+        await ctx.info("Capturing high-quality image...")
+    else:
+        await ctx.info("Grabbing quick preview image...")
     
+    if background:
+        job_id = _start_job(context, _capture(context, high_quality, format))
+        return f"Started capture job {job_id}. Call get_job_result with this id for the image."
+    return await _capture(context, high_quality, format)
+
+async def _autofocus(context: MicroscopeContext) -> str:
+    """Run the autofocus routine and describe how far it moved the stage"""
     # Get position before autofocus
-    before_z = microscope.position['z']
+    before_z = (await context.amicroscope.position())['z']
     
     # Run autofocus as mentioned in README
-    ctx.info("Running autofocus routine...")
-    result = microscope.autofocus()
+    try:
+        result = await asyncio.to_thread(context.microscope.autofocus)
+    finally:
+        # The sync client moved the stage behind the async client's back
+        context.amicroscope.invalidate_position()
     
     # Get position after autofocus
-    after_z = microscope.position['z']
+    after_z = (await context.amicroscope.position())['z']
+    
+    return AUTOFOCUS_TEMPLATE.format(
+        before_z=before_z,
+        after_z=after_z,
+        dz=after_z - before_z,
+        result=result,
+    )
+
+@mcp.tool()
+async def autofocus(ctx: Context, background: bool = False) -> str:
+    """
+    Run the autofocus routine
     
-    return f"""
-    Autofocus completed!
+    Parameters:
+    - background: If True, return a job id straight away and focus in the background;
+      read microscope://job/{id} for the result (default: False)
+    """
+    context = _lifespan_context(ctx)
     
-    Z position before: {before_z}
-    Z position after: {after_z}
-    Z change: {after_z - before_z}
+    await ctx.info("Running autofocus routine...")
+    if background:
+        job_id = _start_job(context, _autofocus(context))
+        return f"Started autofocus job {job_id}. Read microscope://job/{job_id} for the result."
+    return await _autofocus(context)
+
+@mcp.tool(structured_output=False)
+async def get_job_result(ctx: Context, job_id: str) -> Union[Image, str]:
+    """
+    Get the result of a background job started by capture_image or autofocus
     
-    Autofocus result details:
-    {result}
+    Parameters:
+    - job_id: The id returned when the job was started
+    
+    Returns the image for a capture job, or a description of the job if it
+    hasn't finished. The job is forgotten once it has finished and been
+    reported here.
     """
+    context = _lifespan_context(ctx)
+    
+    status = _job_status(context, job_id)
+    task = context.jobs.get(job_id)
+    if task is not None and task.done():
+        del context.jobs[job_id]
+    if status is not None:
+        return status
+    return task.result()
 
 @mcp.tool()
-def call_extension(ctx: Context, extension_name: str, link_name: str, 
-                 method: str = "get", payload: Optional[Dict[str, Any]] = None) -> str:
+async def call_extension(ctx: Context, extension_name: str, link_name: str, 
+                         method: str = "get", payload: Optional[Dict[str, Any]] = None) -> str:
     """
     Call a specific extension method on the microscope
     
@@ -219,42 +733,36 @@ def call_extension(ctx: Context, extension_name: str, link_name: str,
     - method: HTTP method to use ("get" or "post") (default: "get")
     - payload: JSON payload for POST requests (optional)
     """
-    microscope = ctx.request_context.lifespan_context.microscope
+    context = _lifespan_context(ctx)
     
-    # Check if extension exists
-    if extension_name not in microscope.extensions:
-        return f"Extension '{extension_name}' not found. Available extensions: {list(microscope.extensions.keys())}"
+    call = EXTENSION_METHODS.get(method.lower())
+    if call is None:
+        return f"Unknown method '{method}'. Please use 'get' or 'post'."
     
-    # Check if link exists
-    if link_name not in microscope.extensions[extension_name]:
-        return f"Link '{link_name}' not found in extension '{extension_name}'. Available links: {list(microscope.extensions[extension_name].keys())}"
+    link = await asyncio.to_thread(_get_link, context, extension_name, link_name)
+    if link is None:
+        # Check if extension exists
+        ext = context.extensions.get(extension_name)
+        if ext is None:
+            return f"Extension '{extension_name}' not found. Available extensions: {list(context.extensions.keys())}"
+        return f"Link '{link_name}' not found in extension '{extension_name}'. Available links: {list(ext.links.keys())}"
     
     # Call the appropriate method
     try:
-        if method.lower() == "get":
-            result = microscope.extensions[extension_name][link_name].get()
-        elif method.lower() == "post":
-            if payload is None:
-                payload = {}
-            result = microscope.extensions[extension_name][link_name].post_json(payload)
-        else:
-            return f"Unknown method '{method}'. Please use 'get' or 'post'."
-        
-        return f"""
-        Extension call successful:
+        result = await call(context.amicroscope, link, payload)
         
-        Extension: {extension_name}
-        Link: {link_name}
-        Method: {method}
-        
-        Result:
-        {result}
-        """
+        return EXTENSION_CALL_TEMPLATE.format(
+            extension_name=extension_name,
+            link_name=link_name,
+            method=method,
+            result=result,
+        )
     except Exception as e:
         return f"Error calling extension: {str(e)}"
 
-@mcp.tool()
-def run_z_stack(ctx: Context, start_z: int, end_z: int, steps: int = 10) -> str:
+@mcp.tool(structured_output=False)
+async def run_z_stack(ctx: Context, start_z: int, end_z: int, steps: int = 10,
+                      return_images: bool = False, preview_size: int = 512) -> Union[str, List[Union[str, Image]]]:
     """
     Run a Z-stack acquisition
     
@@ -262,60 +770,152 @@ def run_z_stack(ctx: Context, start_z: int, end_z: int, steps: int = 10) -> str:
     - start_z: Starting Z position
     - end_z: Ending Z position
     - steps: Number of images to capture (default: 10)
+    - return_images: If True, return the captured images after the summary (default: False)
+    - preview_size: Longest side in pixels of returned images; 0 returns full frames (default: 512)
     """
-    microscope = ctx.request_context.lifespan_context.microscope
+    if steps < 1:
+        return f"Number of steps must be at least 1 (got {steps})."
+    
+    context = _lifespan_context(ctx)
+    microscope = context.amicroscope
     
     # Calculate step size
     z_step = (end_z - start_z) / (steps - 1) if steps > 1 else 0
     
     # Save starting position to return to later
-    start_pos = microscope.position.copy()
+    start_pos = await microscope.position()
+    
+    # Prefer a single server-side scan to two HTTP requests per step; it keeps
+    # the images on the microscope, so it can't be used to return them. The
+    # scan takes a whole-number stride centred on the current position, so
+    # it only covers exactly the same Z positions as the loop below when the
+    # range splits evenly and has a whole-number midpoint.
+    span = end_z - start_z
+    batchable = (not return_images and steps >= 2
+                 and span % (steps - 1) == 0 and (start_z + end_z) % 2 == 0)
+    scan_link = await asyncio.to_thread(_get_link, context, *ZSTACK_EXTENSION) if batchable else None
+    if scan_link is not None:
+        centre_pos = start_pos.copy()
+        centre_pos['z'] = (start_z + end_z) // 2
+        payload = {
+            "grid": [1, 1, steps],
+            "stride_size": [0, 0, abs(span) // (steps - 1)],
+            "style": "raster",
+            "autofocus_dz": 0,
+            "use_video_port": True,
+            "namemode": "coordinates",
+        }
+        await ctx.info(f"Starting Z-stack acquisition on the microscope from Z={start_z} to Z={end_z} with {steps} steps")
+        try:
+            await microscope.move(centre_pos)
+            result = await microscope.post_json(scan_link.href, payload)
+        except Exception as e:
+            await ctx.warning(f"Batched Z-stack failed, falling back to step-by-step acquisition: {str(e)}")
+        else:
+            # Return to starting position
+            current_pos = await _return_to(microscope, start_pos, await microscope.position())
+            
+            # Report what the scan says it captured rather than what was asked for
+            captured = len(result) if isinstance(result, (list, tuple)) else "an unknown number of"
+            return ZSTACK_BATCHED_TEMPLATE.format(
+                captured=captured,
+                extension='/'.join(ZSTACK_EXTENSION),
+                start_z=start_z,
+                end_z=end_z,
+                z_step=z_step,
+                result=result,
+                position=current_pos,
+            )
+    
+    # Work out every integer Z position up front. Rounding (rather than
+    # truncating) keeps each step within half a unit of its ideal position,
+    # though np.round sends halves to the even neighbour, so steps can
+    # differ by one. A stack with more steps than Z units rounds several
+    # steps onto one position; capture each position once.
+    zs = np.linspace(start_z, end_z, steps).round().astype(int).tolist()
+    zs = [z for i, z in enumerate(zs) if i == 0 or z != zs[i - 1]]
+    if len(zs) < steps:
+        await ctx.info(f"Only {len(zs)} distinct Z positions between Z={start_z} and Z={end_z}; capturing each once")
     
-    # Move to starting Z position
     new_pos = start_pos.copy()
     new_pos['z'] = start_z
-    microscope.move(new_pos)
     
     # Capture Z-stack
     captured_positions = []
-    
-    ctx.info(f"Starting Z-stack acquisition from Z={start_z} to Z={end_z} with {steps} steps")
-    
-    for i in range(steps):
-        # Calculate current Z position
-        current_z = start_z + i * z_step
-        
-        # Move to current Z position
-        current_pos = new_pos.copy()
-        current_pos['z'] = int(current_z)
-        microscope.move(current_pos)
-        
-        # Capture image
-        actual_pos = microscope.position
-        ctx.info(f"Capturing image {i+1}/{steps} at Z={actual_pos['z']}")
-        image = microscope.grab_image()
+    images = []
+    
+    await ctx.info(f"Starting Z-stack acquisition from Z={start_z} to Z={end_z} with {steps} steps")
+    
+    async def frames():
+        # The stage must be still while an image is grabbed, so move and
+        # grab stay in order here; buffering lets the next move start while
+        # the previous frame is still being handled below.
+        for i, current_z in enumerate(zs):
+            # Move to current Z position; the first is where the stack starts
+            if i > 0:
+                current_pos = new_pos.copy()
+                current_pos['z'] = current_z
+                await microscope.move(current_pos)
+            
+            # Capture image; reading the position doesn't disturb the stage,
+            # so it can be fetched alongside the frame
+            actual_pos, image_bytes = await asyncio.gather(
+                microscope.position(), microscope.grab_image_raw()
+            )
+            yield i, actual_pos, image_bytes
+    
+    last_pos = None
+    try:
+        # Move to starting Z position
+        await microscope.move(new_pos)
         
-        captured_positions.append({
-            'index': i+1,
-            'z': actual_pos['z'],
-            'image_size': (image.width, image.height)
-        })
-    
-    # Return to starting position
-    microscope.move(start_pos)
-    
-    return f"""
-    Z-stack acquisition completed!
-    
-    Captured {len(captured_positions)} images
-    Z range: {start_z} to {end_z}
-    Step size: {z_step:.2f}
-    
-    Images captured at Z positions:
-    {[pos['z'] for pos in captured_positions]}
-    
-    Current position: {microscope.position}
-    """
+        # aclosing() stops the frame producer as soon as the loop exits, so
+        # it can't go on moving the stage after a failed step
+        async with aclosing(buffered(frames(), 1)) as acquired:
+            async for i, actual_pos, image_bytes in acquired:
+                last_pos = actual_pos
+                await ctx.info(f"Captured image {i+1}/{len(zs)} at Z={actual_pos['z']}")
+                image = PILImage.open(io.BytesIO(image_bytes))
+                
+                captured_positions.append({
+                    'index': i+1,
+                    'z': actual_pos['z'],
+                    'image_size': (image.width, image.height)
+                })
+                if return_images:
+                    # Shrink in a worker thread so it overlaps the next move; frames
+                    # from the preview stream are already JPEG, so full-size ones are
+                    # returned without decoding and re-encoding them
+                    images.append(asyncio.create_task(
+                        asyncio.to_thread(make_preview, image_bytes, preview_size)
+                    ))
+    except BaseException:
+        # Nothing will collect the previews, and the stage may have moved on
+        # since the last reading
+        for task in images:
+            task.cancel()
+        last_pos = None
+        raise
+    finally:
+        # Return to starting position, even if a step failed, skipping the
+        # move if the last step's reading shows the stage is already there
+        if last_pos is None:
+            last_pos = await microscope.position()
+        current_pos = await _return_to(microscope, start_pos, last_pos)
+    
+    summary = ZSTACK_TEMPLATE.format(
+        count=len(captured_positions),
+        merged=f" ({steps} steps requested; repeated Z positions captured once)" if len(zs) < steps else "",
+        start_z=start_z,
+        end_z=end_z,
+        z_step=z_step,
+        zs=[pos['z'] for pos in captured_positions],
+        position=current_pos,
+    )
+    
+    if return_images:
+        return [summary, *(Image(data=data, format="jpeg") for data in await asyncio.gather(*images))]
+    return summary
 
 # ---- Prompts ----
 